@@ -1,29 +1,197 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
 import requests
 from requests.exceptions import Timeout, ConnectionError
+from urllib3.util import make_headers
+
 from decorators import timer
 
+
 class ApiCaller:
-    def __init__(self, timeout=250):
+    def __init__(self, timeout=250, http2=False, hedge=False, hedge_percentile=95, hedge_budget=0.1, hedge_burst=5,
+                 hedge_min_samples=10, history_size=200):
         """
         Initializes an ApiCaller object.
 
-        :param timeout: Time in seconds to wait for the server response. Defaults to 10 seconds.
+        Responses are requested with gzip/deflate content encoding, and brotli when the `brotli` package is installed.
+        With http2=True the calls go through an httpx client so concurrent calls are multiplexed over one connection.
+        This requires `httpx[http2]` to be installed.
+
+        With hedge=True, a request that is still running after the hedge_percentile latency of its endpoint sends a
+        duplicate request, and the first response to arrive is returned. The duplicates are limited by a token bucket:
+        each request adds hedge_budget tokens, up to hedge_burst, and each duplicate takes one. Over any stretch of
+        time at most hedge_burst + hedge_budget * requests duplicates are sent, so unused budget from a fast period
+        cannot be spent all at once when the server slows down.
+
+        :param timeout: Time in seconds to wait for the server response. Defaults to 250 seconds.
+        :param http2: Use HTTP/2 through httpx instead of a requests session. Defaults to False.
+        :param hedge: Send a duplicate of slow requests. Defaults to False.
+        :param hedge_percentile: Latency percentile of the endpoint after which a duplicate is sent. Defaults to 95.
+        :param hedge_budget: Maximum number of duplicates as a fraction of the requests made. Defaults to 0.1.
+        :param hedge_burst: Maximum number of duplicates that can be saved up and sent in a row. Defaults to 5.
+        :param hedge_min_samples: Number of latencies needed for an endpoint before it is hedged. Defaults to 10.
+        :param history_size: Number of recent latencies kept per endpoint. Defaults to 200.
         """
-        self.session = requests.Session()
         self.timeout = timeout
+        self.http2 = http2
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.hedge_burst = hedge_burst
+        self.hedge_tokens = 0.0
+        self.hedge_min_samples = hedge_min_samples
+        self.bytes_on_wire = 0
+        self.bytes_decoded = 0
+        self.requests_made = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.latencies = defaultdict(lambda: deque(maxlen=history_size))
+        self._stats_lock = threading.Lock()
+        # accept_encoding=True lists br only when a brotli decoder is importable.
+        headers = make_headers(accept_encoding=True)
+        if http2:
+            import httpx
+
+            self.session = httpx.Client(http2=True, headers=headers, timeout=timeout)
+        else:
+            self.session = requests.Session()
+            self.session.headers.update(headers)
 
     @timer
     def get(self, url, params=None):
         """
         Sends a GET request to the given URL and returns the response object.
 
+        :param url: The URL to send the request to.
+        :param params: Additional parameters to send with the request.
+        :return: The response object.
+        """
+        with self._stats_lock:
+            self.requests_made += 1
+            self.hedge_tokens = min(self.hedge_tokens + self.hedge_budget, self.hedge_burst)
+        if self.hedge:
+            return self._get_hedged(url, params)
+        return self._fetch(url, params)
+
+    def _fetch(self, url, params=None):
+        """
+        Sends a single GET request and records its latency for the endpoint.
+
+        :param url: The URL to send the request to.
+        :param params: Additional parameters to send with the request.
+        :return: The response object, or None if the request failed.
+        """
+        start = time.time()
+        response = self._get_http2(url, params) if self.http2 else self._get_http1(url, params)
+        if response is not None:
+            with self._stats_lock:
+                self.latencies[urlsplit(url).path].append(time.time() - start)
+        return response
+
+    def _get_hedged(self, url, params=None):
+        """
+        Sends a GET request, and a duplicate if the first one is slower than the hedge delay of its endpoint.
+
+        :param url: The URL to send the request to.
+        :param params: Additional parameters to send with the request.
+        :return: The first successful response object, or None if all requests failed.
+        """
+        primary = self._start_fetch(url, params)
+        futures = [primary]
+        delay = self.hedge_delay(urlsplit(url).path)
+        if delay is not None:
+            done, _ = wait(futures, timeout=delay)
+            if not done and self._take_hedge():
+                futures.append(self._start_fetch(url, params))
+
+        response = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                response = future.result()
+                if response is not None:
+                    if future is not primary:
+                        with self._stats_lock:
+                            self.hedges_won += 1
+                    # the slower request is left to finish in the background, its response is discarded.
+                    return response
+        return response
+
+    def _start_fetch(self, url, params=None):
+        """
+        Run _fetch in a daemon thread, so that a losing request still waiting on the server does not block exit.
+
+        :param url: The URL to send the request to.
+        :param params: Additional parameters to send with the request.
+        :return: Future resolving to the response object.
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._fetch(url, params))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def close(self):
+        """
+        Close the session and its pooled connections.
+
+        :return: None
+        """
+        self.session.close()
+
+    def hedge_delay(self, endpoint):
+        """
+        Return the time after which a request to the endpoint is hedged.
+
+        :param endpoint: URL path of the endpoint.
+        :return: the hedge_percentile latency in seconds, or None if there is not enough history yet.
+        """
+        with self._stats_lock:
+            history = sorted(self.latencies[endpoint])
+        if len(history) < self.hedge_min_samples:
+            return None
+        rank = max(math.ceil(self.hedge_percentile / 100 * len(history)) - 1, 0)
+        return history[rank]
+
+    def _take_hedge(self):
+        """
+        Reserve a duplicate request from the hedge budget.
+
+        :return: True if the budget allows another duplicate request.
+        """
+        with self._stats_lock:
+            if self.hedge_tokens < 1:
+                return False
+            self.hedge_tokens -= 1
+            self.hedges_sent += 1
+            return True
+
+    def _get_http1(self, url, params=None):
+        """
+        Sends a GET request through the requests session and returns the response object.
+
         :param url: The URL to send the request to.
         :param params: Additional parameters to send with the request.
         :return: The response object.
         """
         try:
-            response = self.session.get(url, params=params, timeout=self.timeout)
+            # stream=True lets .content decompress chunk by chunk while urllib3 counts the encoded bytes.
+            response = self.session.get(url, params=params, timeout=self.timeout, stream=True)
             response.raise_for_status()  # This will raise an HTTPError if the HTTP request returned an unsuccessful status code
+            content = response.content
+            # tell() counts the encoded bytes read so far, so it is only complete once the body has been read.
+            self._record_transfer(response.raw.tell(), len(content))
             return response
         except Timeout:
             print(f"Request to {url} timed out.")
@@ -34,3 +202,63 @@ class ApiCaller:
         except requests.RequestException as e:
             print(f"An error occurred while requesting {url}. Error: {e}")
             return None
+
+    def _get_http2(self, url, params=None):
+        """
+        Sends a GET request through the httpx client and returns the response object.
+
+        :param url: The URL to send the request to.
+        :param params: Additional parameters to send with the request.
+        :return: The response object.
+        """
+        import httpx
+
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            content = response.content
+            self._record_transfer(response.num_bytes_downloaded, len(content))
+            return response
+        except httpx.TimeoutException:
+            print(f"Request to {url} timed out.")
+            return None
+        except httpx.ConnectError:
+            print(f"Connection error occurred while connecting to {url}.")
+            return None
+        except httpx.HTTPError as e:
+            print(f"An error occurred while requesting {url}. Error: {e}")
+            return None
+
+    def _record_transfer(self, wire, decoded):
+        """
+        Adds the size of a response to the running totals.
+
+        :param wire: Number of bytes received on the wire, before content decoding.
+        :param decoded: Number of bytes after content decoding.
+        """
+        with self._stats_lock:
+            self.bytes_on_wire += wire
+            self.bytes_decoded += decoded
+
+    def transfer_stats(self):
+        """
+        Return the bytes received on the wire against the decoded bytes for all calls made so far.
+        :return: a dictionary with the byte totals and the compression ratio
+        """
+        with self._stats_lock:
+            wire, decoded = self.bytes_on_wire, self.bytes_decoded
+        return {"bytes_on_wire": wire,
+                "bytes_decoded": decoded,
+                "compression_ratio": round(decoded / wire, 2) if wire else None,
+                }
+
+    def hedge_stats(self):
+        """
+        Return the number of requests made, duplicates sent and duplicates that answered first.
+        :return: a dictionary of hedging counters
+        """
+        with self._stats_lock:
+            return {"requests_made": self.requests_made,
+                    "hedges_sent": self.hedges_sent,
+                    "hedges_won": self.hedges_won,
+                    }
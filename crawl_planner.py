@@ -0,0 +1,335 @@
+import glob
+import heapq
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from data_extractor import CadastralAPI, PropertyExtractor, PropertyHTML, Subdivision, get_caller, save_to_json
+from models import Property
+
+SIZES_FILEPATH = os.path.join("data", "subdivision_sizes.json")
+
+# Number of API calls made by PropertyHTML.fetch_all_data() for each property.
+CALLS_PER_PROPERTY = 8
+
+# Seconds assumed for a search by subdivision call when no duration of it has been recorded yet.
+DEFAULT_SEARCH_SECONDS = 5.0
+
+SEARCH_ENDPOINT = "/search/searchbysubdivision"
+
+
+def shard_sizes_filepath(filepath, shard_index):
+    """
+    Return the sizes file written by one shard, next to the sizes cache, so that shards never write the same file.
+
+    :param filepath: Path of the subdivision sizes cache.
+    :param shard_index: Index of the shard.
+    :return: Path of the shard sizes file, e.g. data/subdivision_sizes.shard0.json.
+    """
+    root, extension = os.path.splitext(filepath)
+    return f"{root}.shard{shard_index}{extension}"
+
+
+def _size_entry(value):
+    """
+    Return a sizes cache entry as a dictionary. Files written before entries had a timestamp hold plain numbers, which
+    are treated as older than any timestamped entry.
+
+    :param value: entry read from a sizes file.
+    :return: dictionary with the number of properties, the recorded time and the search seconds if known.
+    """
+    if isinstance(value, dict):
+        return value
+    return {"properties": value, "recorded": 0}
+
+
+def _shard_sizes_filepaths(filepath):
+    root, extension = os.path.splitext(filepath)
+    return glob.glob(f"{glob.escape(root)}.shard*{extension}")
+
+
+def load_subdivision_sizes(filepath=SIZES_FILEPATH):
+    """
+    Load the cached size of each subdivision, merged with the sizes files written by shards. When several files have
+    an entry for the same subdivision, the most recently recorded one is kept, whatever the file names.
+
+    :param filepath: Path of the subdivision sizes cache.
+    :return: dictionary of "[County Id]/[Subdivision Name]" to a dictionary with the number of properties
+             ("properties"), the time it was recorded ("recorded") and, if measured, the seconds of the search by
+             subdivision call ("search_seconds").
+    """
+    sizes = {}
+    for path in [filepath] + _shard_sizes_filepaths(filepath):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as file:
+            for key, value in json.load(file).items():
+                entry = _size_entry(value)
+                if key not in sizes or entry["recorded"] >= sizes[key]["recorded"]:
+                    sizes[key] = entry
+    return sizes
+
+
+def _save_sizes(sizes, filepath):
+    """
+    Write a sizes file atomically.
+
+    :param sizes: dictionary of sizes cache entries.
+    :param filepath: Path of the sizes file.
+    """
+    directory = os.path.dirname(filepath) or "."
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    # write to a temporary file and rename it, so that readers never see a half written file.
+    descriptor, temporary_filepath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(descriptor)
+    save_to_json(sizes, temporary_filepath)
+    os.replace(temporary_filepath, filepath)
+
+
+def merge_subdivision_sizes(filepath=SIZES_FILEPATH):
+    """
+    Fold the sizes files written by shards into the sizes cache and remove them. Run it once the shards have finished,
+    e.g. before building the next plan.
+
+    :param filepath: Path of the subdivision sizes cache.
+    :return: Number of subdivisions in the sizes cache.
+    """
+    shard_filepaths = _shard_sizes_filepaths(filepath)
+    sizes = load_subdivision_sizes(filepath)
+    if shard_filepaths:
+        _save_sizes(sizes, filepath)
+        for shard_filepath in shard_filepaths:
+            os.remove(shard_filepath)
+    return len(sizes)
+
+
+def count_crawled_properties(county_name, subdivision_name):
+    """
+    Count the geocode directories of a subdivision that has already been crawled.
+
+    :param county_name: Name of the county.
+    :param subdivision_name: Name of the subdivision.
+    :return: Number of properties, or None if the subdivision has not been crawled.
+    """
+    directory = os.path.join("data", "counties", county_name, subdivision_name)
+    if not os.path.isdir(directory):
+        return None
+    return sum(os.path.isdir(os.path.join(directory, entry)) for entry in os.listdir(directory))
+
+
+def record_subdivision_size(county_id, subdivision_name, n_properties, filepath=SIZES_FILEPATH,
+                            search_seconds=None):
+    """
+    Save the number of properties of a subdivision in the sizes cache, with the time it was recorded.
+
+    :param county_id: ID of the county.
+    :param subdivision_name: Name of the subdivision.
+    :param n_properties: Number of properties in the subdivision.
+    :param filepath: Path of the sizes file, which should only be written by one process.
+    :param search_seconds: Optional measured seconds of the search by subdivision call.
+    """
+    sizes = {}
+    if os.path.exists(filepath):
+        with open(filepath, 'r') as file:
+            sizes = json.load(file)
+    entry = {"properties": n_properties, "recorded": time.time()}
+    if search_seconds is not None:
+        entry["search_seconds"] = round(search_seconds, 3)
+    sizes[f"{county_id}/{subdivision_name}"] = entry
+    _save_sizes(sizes, filepath)
+
+
+def search_cost(sizes):
+    """
+    Estimate the seconds of a search by subdivision call from recorded durations: the ones measured by run_shard and
+    kept in the sizes cache, and the latencies of the call recorded by the ApiCaller of this process. Falls back to
+    DEFAULT_SEARCH_SECONDS when none have been recorded.
+
+    :param sizes: dictionary returned by load_subdivision_sizes.
+    :return: tuple of (median seconds, number of recorded durations it is based on).
+    """
+    durations = [entry["search_seconds"] for entry in sizes.values() if entry.get("search_seconds") is not None]
+    for path, latencies in list(get_caller().latencies.items()):
+        if path.endswith(SEARCH_ENDPOINT):
+            durations.extend(latencies)
+    if not durations:
+        return DEFAULT_SEARCH_SECONDS, 0
+    return statistics.median(durations), len(durations)
+
+
+def property_cost(timer_filepaths, concurrent=False):
+    """
+    Estimate the seconds needed to fetch one property from recorded endpoint latencies.
+
+    :param timer_filepaths: Paths to timing captures (PropertyHTML.time_taken() lists, like samples_timer.json).
+    :param concurrent: If True, the calls of a property run in parallel and the slowest call sets its latency.
+    :return: Mean seconds per property.
+    """
+    costs = []
+    for filepath in timer_filepaths:
+        with open(filepath, 'r') as file:
+            for timing in json.load(file):
+                latencies = [value for key, value in timing.items() if key != "Geocode" and value is not None]
+                if latencies:
+                    costs.append(max(latencies) if concurrent else sum(latencies))
+    if not costs:
+        raise ValueError(f"No endpoint timings found in {', '.join(timer_filepaths)}, cannot estimate the seconds "
+                         f"per property")
+    return statistics.mean(costs)
+
+
+def build_plan(timer_filepaths=("samples_timer.json",), county_ids=None, concurrent=False, fetch_details=True,
+               search_seconds=None, default_size=None, sizes_filepath=SIZES_FILEPATH):
+    """
+    Build a crawl plan of every subdivision, with the estimated requests and duration, largest subdivisions first.
+
+    The crawl of a subdivision has two phases, which are estimated separately. The discovery phase is the single
+    search by subdivision call that lists its properties. The details phase runs PropertyHTML.fetch_all_data() for
+    each property, and is skipped when fetch_details is False.
+
+    Only the county and subdivision lists are fetched. Subdivision sizes come from the sizes cache or from the data
+    directory. Subdivisions of unknown size are assumed to be default_size, which defaults to the median known size.
+
+    :param timer_filepaths: Paths to timing captures used to estimate the seconds per property.
+    :param county_ids: Optional list of county ids to plan, defaults to all counties.
+    :param concurrent: Whether the calls of a property will be run in parallel.
+    :param fetch_details: Whether the details of each property will be fetched.
+    :param search_seconds: Estimated seconds of the search by subdivision call. Defaults to the duration measured
+                           for the subdivision by a previous run_shard, then to the estimate of search_cost().
+    :param default_size: Number of properties assumed for subdivisions of unknown size.
+    :param sizes_filepath: Path of the subdivision sizes cache.
+    :return: dictionary with the plan totals and the list of subdivisions to crawl.
+    """
+    seconds_per_property = property_cost(timer_filepaths, concurrent) if fetch_details else 0.0
+    sizes = load_subdivision_sizes(sizes_filepath)
+    if search_seconds is None:
+        default_search_seconds, search_samples = search_cost(sizes)
+    else:
+        default_search_seconds, search_samples = search_seconds, None
+
+    items = []
+    for county in CadastralAPI.get_counties():
+        if county_ids is not None and county['Id'] not in county_ids:
+            continue
+        for subdiv in CadastralAPI.get_subdivisions(county['Id']):
+            if not subdiv['Subdiv']:
+                continue
+            entry = sizes.get(f"{county['Id']}/{subdiv['Subdiv']}", {})
+            size = entry.get("properties")
+            if size is None:
+                size = count_crawled_properties(county['Name'], subdiv['Subdiv'])
+            discovery_seconds = search_seconds
+            if discovery_seconds is None:
+                discovery_seconds = entry.get("search_seconds", default_search_seconds)
+            items.append({"county_id": county['Id'],
+                          "county_name": county['Name'],
+                          "subdivision": subdiv['Subdiv'],
+                          "properties": size,
+                          "size_known": size is not None,
+                          "discovery_seconds": round(discovery_seconds, 1),
+                          })
+
+    if default_size is None:
+        known = [item["properties"] for item in items if item["size_known"]]
+        default_size = round(statistics.median(known)) if known else 1
+    for item in items:
+        if not item["size_known"]:
+            item["properties"] = default_size
+        item["discovery_requests"] = 1
+        item["details_requests"] = CALLS_PER_PROPERTY * item["properties"] if fetch_details else 0
+        item["details_seconds"] = round(seconds_per_property * item["properties"], 1)
+        item["requests"] = item["discovery_requests"] + item["details_requests"]
+        item["seconds"] = round(item["discovery_seconds"] + item["details_seconds"], 1)
+
+    # largest first, so the long subdivisions do not end up as stragglers at the end of the crawl.
+    items.sort(key=lambda item: item["seconds"], reverse=True)
+    plan = {"seconds_per_property": round(seconds_per_property, 2),
+            "search_seconds": round(default_search_seconds, 2),
+            # None when search_seconds was given, 0 when it is DEFAULT_SEARCH_SECONDS.
+            "search_samples": search_samples,
+            "concurrent": concurrent,
+            "fetch_details": fetch_details,
+            "subdivisions": len(items),
+            "properties": sum(item["properties"] for item in items),
+            }
+    for total in ["discovery_requests", "discovery_seconds", "details_requests", "details_seconds", "requests",
+                  "seconds"]:
+        plan[total] = round(sum(item[total] for item in items), 1)
+    plan["items"] = items
+    return plan
+
+
+def split_plan(plan, n_shards):
+    """
+    Split a plan into shards of balanced estimated duration, assigning each subdivision (largest first) to the
+    shard with the least work so far.
+
+    :param plan: dictionary returned by build_plan.
+    :param n_shards: Number of parallel workers.
+    :return: list of shards, each a dictionary with its estimated totals and items.
+    """
+    shards = [{"shard": index, "concurrent": plan["concurrent"], "fetch_details": plan["fetch_details"],
+               "requests": 0, "seconds": 0.0, "items": []} for index in range(n_shards)]
+    loads = [(0.0, index) for index in range(n_shards)]
+    for item in plan["items"]:
+        load, index = heapq.heappop(loads)
+        shard = shards[index]
+        shard["items"].append(item)
+        shard["requests"] += item["requests"]
+        shard["seconds"] = round(load + item["seconds"], 1)
+        heapq.heappush(loads, (load + item["seconds"], index))
+    return shards
+
+
+def run_shard(shard, sizes_filepath=SIZES_FILEPATH):
+    """
+    Crawl the subdivisions of a shard in order, running the phases the plan was estimated for, and record their
+    sizes and search durations for future plans.
+
+    The discovery phase saves the property list of the subdivision like populate_directory_for_subdivision(). The
+    details phase saves the parsed Property of each geocode as property_details.json in its directory.
+
+    :param shard: one of the shards returned by split_plan.
+    :param sizes_filepath: Path of the subdivision sizes cache. The shard writes its own file next to it.
+    :return: None
+    """
+    for item in shard["items"]:
+        county_directory = os.path.join("data", "counties", item["county_name"])
+        subdivision = Subdivision(name=item["subdivision"], county_name=item["county_name"],
+                                  county_id=item["county_id"])
+        start = time.time()
+        subdivision.fetch_properties()
+        search_seconds = time.time() - start
+        subdivision.save_properties()
+        subdivision.extract_and_save_properties(county_directory)
+        properties = PropertyExtractor(subdivision.properties_html).extract_properties()
+        record_subdivision_size(item["county_id"], item["subdivision"], len(properties),
+                                shard_sizes_filepath(sizes_filepath, shard["shard"]), search_seconds)
+
+        if not shard["fetch_details"]:
+            continue
+        for prop in properties:
+            property_html = PropertyHTML(prop["Geocode"])
+            property_html.fetch_all_data(concurrent=shard["concurrent"])
+            property_object = Property()
+            property_object.populate_from_property_html_object(property_html)
+            save_to_json(property_object.json(),
+                         os.path.join(county_directory, item["subdivision"], prop["Geocode"], "property_details.json"))
+
+
+if __name__ == "__main__":
+    # usage: python crawl_planner.py n_shards [county_id ...]
+    merge_subdivision_sizes()
+    crawl_plan = build_plan(county_ids=sys.argv[2:] or None)
+    crawl_plan["shards"] = split_plan(crawl_plan, int(sys.argv[1]))
+    save_to_json(crawl_plan, "crawl_plan.json")
+    print(f"{crawl_plan['subdivisions']} subdivisions, {crawl_plan['properties']} properties")
+    print(f"discovery: {crawl_plan['discovery_requests']} requests of {crawl_plan['search_seconds']} s "
+          f"({crawl_plan['search_samples']} recorded searches), "
+          f"about {crawl_plan['discovery_seconds'] / 3600:.1f} hours sequentially")
+    print(f"details: {crawl_plan['details_requests']} requests, "
+          f"about {crawl_plan['details_seconds'] / 3600:.1f} hours sequentially")
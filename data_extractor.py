@@ -1,20 +1,47 @@
 import time
 
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import re
 import json
 
-from bs4 import BeautifulSoup
-
 from api_caller import ApiCaller
 
-caller = ApiCaller()
+_caller = None
 
 BASE_URL = "https://svc.mt.gov/msl/legacycadastralapi"
 
 
+def get_caller():
+    """
+    Return the shared ApiCaller, creating it on first use.
+
+    The session is created lazily so that importing this module does not open any network objects,
+    which keeps worker startup cheap for jobs that only parse stored data.
+
+    :return: the module level ApiCaller instance.
+    """
+    global _caller
+    if _caller is None:
+        _caller = ApiCaller()
+    return _caller
+
+
+def configure_caller(**kwargs):
+    """
+    Replace the shared ApiCaller with one built from the given options, e.g. configure_caller(http2=True).
+
+    :param kwargs: keyword arguments passed to ApiCaller.
+    :return: the new ApiCaller instance.
+    """
+    global _caller
+    if _caller is not None:
+        _caller.close()
+    _caller = ApiCaller(**kwargs)
+    return _caller
+
+
 class CadastralAPI:
     """
     Utility class to handle API calls to the Cadastral API.
@@ -28,7 +55,7 @@ class CadastralAPI:
         :return: List of counties from the API.
         """
         url = f"{BASE_URL}/search/getcountylist"
-        response = caller.get(url)
+        response = get_caller().get(url)
         return response.json()
 
     @staticmethod
@@ -40,7 +67,7 @@ class CadastralAPI:
         :return: List of subdivisions for the specified county.
         """
         url = f"{BASE_URL}/search/getsubdivisionlist?countyid={county_id}"
-        response = caller.get(url)
+        response = get_caller().get(url)
         return response.json()
 
     @staticmethod
@@ -63,14 +90,14 @@ class CadastralAPI:
             return re.sub(r'\\(?![/u"bfnrt])', r'\\\\', data_str)
 
         url = f"{BASE_URL}/search/searchbysubdivision?subdivision={subdivision_name}&countyid={county_id}"
-        response = caller.get(url)
+        response = get_caller().get(url)
 
         # the code below is to handle the case when the API returns an empty response.
         # For some reason the response is empty sometimes, so we try to fetch the data again.
         # If the response is still empty after 5 tries, we raise an exception.
         if response.content == b'':
             for _ in range(5):
-                response = caller.get(url)
+                response = get_caller().get(url)
                 if response.content != b'':
                     break
             else:
@@ -210,7 +237,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/summary/getsummarydata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_summary = elapsed
         self.summary_data = response.content.decode('utf-8')
@@ -223,7 +250,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/owner/getownerdata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_owner = elapsed
         self.owner_data = response.content.decode('utf-8')
@@ -236,7 +263,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/appraisal/getappraisaldata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_appraisal = elapsed
         self.appraisal_data = response.content.decode('utf-8')
@@ -249,7 +276,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/marketland/getmarketlanddata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_market_land = elapsed
         self.market_land_data = response.content.decode('utf-8')
@@ -262,7 +289,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/dwelling/getdwellingdata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_dwelling = elapsed
         self.dwelling_data = response.content.decode('utf-8')
@@ -275,7 +302,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/otherbuilding/getotherbuildingdata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_other_building = elapsed
         self.other_building_data = response.content.decode('utf-8')
@@ -288,7 +315,7 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/commercial/getcommercialdata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_commercial = elapsed
         self.commercial_data = response.content.decode('utf-8')
@@ -301,25 +328,34 @@ class PropertyHTML:
         """
         url = f"{BASE_URL}/agforest/getagforestdata?geocode={self.geocode}&year={self.year}"
         start = time.time()
-        response = caller.get(url)
+        response = get_caller().get(url)
         elapsed = round(time.time() - start, 2)
         self.time_taken_agricultural = elapsed
         self.agricultural_data = response.content.decode('utf-8')
 
-    def fetch_all_data(self):
+    def fetch_all_data(self, concurrent=False):
         """
         Fetch and store all data types for the property.
 
+        :param concurrent: Run the calls in parallel threads. With an HTTP/2 caller they share one connection.
         :return: None
         """
-        self.fetch_summary_data()
-        self.fetch_owner_data()
-        self.fetch_appraisal_data()
-        self.fetch_market_land_data()
-        self.fetch_dwelling_data()
-        self.fetch_other_building_data()
-        self.fetch_commercial_data()
-        self.fetch_agricultural_data()
+        fetchers = [self.fetch_summary_data,
+                    self.fetch_owner_data,
+                    self.fetch_appraisal_data,
+                    self.fetch_market_land_data,
+                    self.fetch_dwelling_data,
+                    self.fetch_other_building_data,
+                    self.fetch_commercial_data,
+                    self.fetch_agricultural_data,
+                    ]
+        if not concurrent:
+            for fetch in fetchers:
+                fetch()
+            return
+        with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+            for future in [executor.submit(fetch) for fetch in fetchers]:
+                future.result()
 
     def time_taken(self):
         """
@@ -440,6 +476,9 @@ class PropertyExtractor:
 
         :param property_html: The HTML string containing property details.
         """
+        # bs4 is only needed for parsing search results, so it is not imported by fetch-only workers.
+        from bs4 import BeautifulSoup
+
         self.soup = BeautifulSoup(property_html, 'html.parser')
 
     def extract_properties(self):
@@ -19,3 +19,34 @@ def timer(func):
         return result
 
     return wrapper
+
+
+def memoize_parse(endpoint, attributes):
+    """Decorator for memoizing the Property.update_* methods in the object's parse cache.
+
+    When the object has a parse_cache and the raw html string of the endpoint has been parsed before, the stored
+    attributes are restored without decoding or parsing the html again.
+    :param endpoint: name of the endpoint the html string comes from
+    :param attributes: names of the attributes set by the decorated method, which must assign all of them on every call
+    :return: decorator
+    """
+
+    def decorator(func):
+        def wrapper(self, html_string):
+            cache = getattr(self, "parse_cache", None)
+            if cache is None:
+                return func(self, html_string)
+            cached = cache.get(endpoint, html_string)
+            if cached is not None:
+                for attribute in attributes:
+                    setattr(self, attribute, cached[attribute])
+                return None
+            result = func(self, html_string)
+            cache.put(endpoint, html_string, {attribute: getattr(self, attribute) for attribute in attributes})
+            return result
+
+        wrapper.__doc__ = func.__doc__
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    return decorator
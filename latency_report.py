@@ -0,0 +1,236 @@
+import json
+import math
+import os
+import sys
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from scipy import stats
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Candidate distributions for the response time tail, fitted with the location fixed at zero.
+TAIL_MODELS = {
+    "lognorm": stats.lognorm,
+    "gamma": stats.gamma,
+    "weibull_min": stats.weibull_min,
+    "expon": stats.expon,
+}
+
+
+def load_timings(*filepaths):
+    """
+    Load one or more timing captures (lists of PropertyHTML.time_taken() dictionaries, like samples_timer.json).
+
+    :param filepaths: paths to the timing captures.
+    :return: DataFrame with one row per geocode and one column of response times (seconds) per endpoint.
+    """
+    frames = []
+    for filepath in filepaths:
+        with open(filepath, 'r') as file:
+            frame = pd.DataFrame(json.load(file))
+        frame["capture"] = os.path.basename(filepath)
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True)
+    return df.set_index(["capture", "Geocode"]).apply(pd.to_numeric, errors="coerce")
+
+
+def endpoint_statistics(df):
+    """
+    Compute the response time distribution of each endpoint.
+
+    :param df: DataFrame returned by load_timings.
+    :return: DataFrame with one row per endpoint.
+    """
+    summary = pd.DataFrame({
+        "count": df.count(),
+        "mean": df.mean(),
+        "std": df.std(),
+        "min": df.min(),
+        "max": df.max(),
+    })
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = df.quantile(percentile / 100)
+    return summary.round(3)
+
+
+def upper_tail_anderson_darling(samples, cdf):
+    """
+    Compute the upper tail Anderson-Darling statistic of a fitted distribution.
+
+    Unlike the Kolmogorov-Smirnov statistic, which is dominated by the body of the distribution, this statistic
+    weights the misfit by 1 / (1 - F), so it grows quickly when the fitted tail is too light or too heavy.
+
+    :param samples: observed values.
+    :param cdf: fitted cumulative distribution function.
+    :return: the statistic, lower is a better fit.
+    """
+    n = len(samples)
+    probabilities = np.clip(cdf(np.sort(samples)), 1e-12, 1 - 1e-12)
+    weights = 2 - (2 * np.arange(1, n + 1) - 1) / n
+    return float(n / 2 - 2 * probabilities.sum() - (weights * np.log(1 - probabilities)).sum())
+
+
+def fit_tail_models(df):
+    """
+    Fit each candidate distribution to the response times of each endpoint and keep the best fit of the tail,
+    judged by the upper tail Anderson-Darling statistic. The empirical p99 is reported next to the fitted one.
+
+    :param df: DataFrame returned by load_timings.
+    :return: dictionary of endpoint to the best model, its parameters and its predicted tail percentiles.
+    """
+    models = {}
+    for endpoint in df.columns:
+        samples = df[endpoint].dropna()
+        samples = samples[samples > 0].to_numpy()
+        if len(samples) < 5:
+            continue
+        best = None
+        for name, distribution in TAIL_MODELS.items():
+            params = distribution.fit(samples, floc=0)
+            statistic = upper_tail_anderson_darling(samples, lambda x: distribution.cdf(x, *params))
+            p99, p999 = distribution.ppf([0.99, 0.999], *params)
+            if not np.isfinite([statistic, p99, p999]).all():
+                continue
+            if best is None or statistic < best["tail_ad_statistic"]:
+                best = {"model": name,
+                        "params": [round(float(param), 4) for param in params],
+                        "tail_ad_statistic": round(statistic, 4),
+                        "samples": len(samples),
+                        "empirical_p99": round(float(np.percentile(samples, 99)), 2),
+                        "p99": round(float(p99), 2),
+                        "p999": round(float(p999), 2),
+                        }
+        if best is not None:
+            models[endpoint] = best
+    return models
+
+
+def _without_nan(data):
+    """
+    Replace NaN values, e.g. the std of an endpoint with a single sample, with None so the report is valid JSON.
+
+    :param data: nested dictionaries and lists of numbers.
+    :return: the same structure with NaN replaced by None.
+    """
+    if isinstance(data, dict):
+        return {key: _without_nan(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_without_nan(value) for value in data]
+    if isinstance(data, float) and math.isnan(data):
+        return None
+    return data
+
+
+def estimate_wall_time(df, n_properties, workers=1):
+    """
+    Estimate the wall time to fetch a subdivision, from the per-geocode timings.
+
+    Sequential runs the eight calls of each property one after another, one property at a time. Concurrent runs the
+    eight calls of a property in parallel, so a property takes as long as its slowest call, with `workers` properties
+    in flight at once.
+
+    :param df: DataFrame returned by load_timings.
+    :param n_properties: number of properties in the subdivision.
+    :param workers: number of properties fetched at the same time.
+    :return: dictionary of estimated wall times in seconds.
+    """
+    per_property_sequential = df.sum(axis=1, min_count=1).dropna()
+    per_property_concurrent = df.max(axis=1).dropna()
+    rounds = math.ceil(n_properties / workers)
+    return {"n_properties": n_properties,
+            "workers": workers,
+            "sequential": round(float(per_property_sequential.mean() * n_properties), 1),
+            "concurrent": round(float(per_property_concurrent.mean() * rounds), 1),
+            "property_p95_sequential": round(float(per_property_sequential.quantile(0.95)), 2),
+            "property_p95_concurrent": round(float(per_property_concurrent.quantile(0.95)), 2),
+            }
+
+
+def suggest_timeouts(models, margin=1.5):
+    """
+    Suggest a per-endpoint timeout from the p99.9 of its fitted tail model.
+
+    :param models: dictionary returned by fit_tail_models.
+    :param margin: factor applied on top of the p99.9.
+    :return: dictionary of endpoint to timeout in whole seconds.
+    """
+    return {endpoint: int(np.ceil(model["p999"] * margin)) for endpoint, model in models.items()}
+
+
+def plot_report(df, models, output_dir):
+    """
+    Save the box plot and the empirical CDF of each endpoint, with the fitted CDF overlaid, as PNG files.
+
+    :param df: DataFrame returned by load_timings.
+    :param models: dictionary returned by fit_tail_models.
+    :param output_dir: directory where the plots should be saved.
+    :return: list of saved file paths.
+    """
+    long_df = df.melt(var_name="endpoint", value_name="seconds").dropna()
+    saved = []
+
+    fig, ax = plt.subplots(figsize=(15, 8))
+    sns.boxplot(data=long_df, x="endpoint", y="seconds", ax=ax)
+    ax.set_title("Distribution of Response Times for Each API Call")
+    ax.set_ylabel("Response Time (seconds)")
+    ax.tick_params(axis="x", rotation=45)
+    fig.tight_layout()
+    saved.append(os.path.join(output_dir, "response_time_boxplot.png"))
+    fig.savefig(saved[-1])
+    plt.close(fig)
+
+    columns = 4
+    rows = math.ceil(len(df.columns) / columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(5 * columns, 4 * rows), squeeze=False)
+    for ax, endpoint in zip(axes.flat, df.columns):
+        samples = df[endpoint].dropna()
+        sns.ecdfplot(samples, ax=ax, label="observed")
+        if endpoint in models:
+            model = models[endpoint]
+            grid = np.linspace(0, samples.max() * 1.2, 200)
+            ax.plot(grid, TAIL_MODELS[model["model"]].cdf(grid, *model["params"]), label=model["model"])
+        ax.set_title(endpoint)
+        ax.set_xlabel("seconds")
+        ax.legend()
+    for ax in list(axes.flat)[len(df.columns):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    saved.append(os.path.join(output_dir, "response_time_cdf.png"))
+    fig.savefig(saved[-1])
+    plt.close(fig)
+    return saved
+
+
+def generate_report(filepaths, output_dir, n_properties, workers=1):
+    """
+    Analyze timing captures and save the statistics, tail models, wall time estimate and plots.
+
+    :param filepaths: paths to the timing captures.
+    :param output_dir: directory where the report should be saved.
+    :param n_properties: number of properties in the subdivision to estimate the wall time for.
+    :param workers: number of properties fetched at the same time.
+    :return: dictionary with the report content.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    df = load_timings(*filepaths)
+    models = fit_tail_models(df)
+    report = {"captures": [os.path.basename(filepath) for filepath in filepaths],
+              "endpoints": endpoint_statistics(df).to_dict(orient="index"),
+              "tail_models": models,
+              "suggested_timeouts": suggest_timeouts(models),
+              "wall_time": estimate_wall_time(df, n_properties, workers),
+              "plots": plot_report(df, models, output_dir),
+              }
+    with open(os.path.join(output_dir, "latency_report.json"), 'w') as file:
+        json.dump(_without_nan(report), file, indent=4, allow_nan=False)
+    return report
+
+
+if __name__ == "__main__":
+    # usage: python latency_report.py n_properties workers samples_timer.json [more_captures.json ...]
+    generate_report(sys.argv[3:], "latency_report", int(sys.argv[1]), int(sys.argv[2]))
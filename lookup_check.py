@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+import data_extractor
+from lookup_service import LookupRequestHandler, LookupService, PropertyStore
+from parse_cache import ParseCache
+
+# Minimal endpoint documents that the Property.update_* methods can parse. Only the summary depends on the geocode,
+# so the other documents are byte-identical across properties and are served from the parse cache after the first.
+ENDPOINT_DOCUMENTS = {
+    "summary": "<div>\r\n\t<span class='key'>Geocode:</span><span class='value'>{geocode}</span>\r\n</div>",
+    "owner": "<table>\r\n\t<tr><td class='darkHeader'>Owner</td></tr>\r\n</table>",
+    "appraisal": "<table><tr><th>Year</th></tr><tr><td>2023</td><td>100</td><td>200</td><td>300</td></tr></table>",
+    "marketland": "<table><tr><th>Market Land</th></tr></table>",
+    "dwelling": "<table><tr><th>Dwelling</th></tr></table>",
+    "otherbuilding": "<table><tr><th>Other Building</th></tr></table>",
+    "commercial": "<table><tr><th>Commercial</th></tr></table>",
+    "agforest": "<table><tr><th>Agriculture</th></tr></table>",
+}
+
+
+class CadastralStubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves ENDPOINT_DOCUMENTS as JSON strings, like the Cadastral API endpoints.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        geocode = parse_qs(url.query).get("geocode", [""])[0]
+        document = ENDPOINT_DOCUMENTS[url.path.strip("/").split("/")[0]].format(geocode=geocode)
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(handler, **attributes):
+    """
+    Start a local server on a free port in a daemon thread.
+
+    :param handler: request handler class.
+    :param attributes: attributes set on the server object.
+    :return: the server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_lookup_service(n_properties=20, workers=4):
+    """
+    Run a LookupService with several workers sharing one ParseCache against a local stub of the Cadastral API, and
+    check that every lookup succeeds, that identical documents are served from the cache and that a bad year or
+    geocode gets a 400.
+
+    :param n_properties: Number of distinct geocodes looked up concurrently.
+    :param workers: Number of worker threads of the service.
+    :return: the service stats.
+    """
+    directory = tempfile.mkdtemp()
+    stub = start_server(CadastralStubRequestHandler)
+    data_extractor.BASE_URL = f"http://127.0.0.1:{stub.server_address[1]}"
+    data_extractor.configure_caller(timeout=10)
+    parse_cache = ParseCache(os.path.join(directory, "parse_cache.sqlite"))
+    service = LookupService(store=PropertyStore(os.path.join(directory, "lookup")), workers=workers,
+                            parse_cache=parse_cache)
+    lookup = start_server(LookupRequestHandler, service=service)
+    base_url = f"http://127.0.0.1:{lookup.server_address[1]}"
+
+    responses = {}
+
+    def get(geocode):
+        responses[geocode] = requests.get(f"{base_url}/property", params={"geocode": geocode, "year": 2023},
+                                          timeout=30)
+
+    try:
+        threads = [threading.Thread(target=get, args=(f"03-0927-17-3-17-11-{index:04d}",))
+                   for index in range(n_properties)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        bad_year = requests.get(f"{base_url}/property", params={"geocode": "03-0927-17-3-17-11-0000", "year": "abc"},
+                                timeout=30)
+        bad_geocodes = [requests.get(f"{base_url}/property", params={"geocode": geocode}, timeout=30)
+                        for geocode in ["../../secret", "03-0927-17-3-17-11-0000&year=1999"]]
+        stats = service.stats()
+    finally:
+        stub.shutdown()
+        lookup.shutdown()
+
+    for geocode, response in responses.items():
+        assert response.status_code == 200, (geocode, response.status_code, response.text)
+        data = response.json()
+        assert data["property"]["geocode"] == geocode, data
+        assert data["property"]["year"] == 2023, data
+    assert bad_year.status_code == 400, bad_year.status_code
+    assert [response.status_code for response in bad_geocodes] == [400, 400], bad_geocodes
+    assert parse_cache.hits > 0, "identical documents were not served from the parse cache"
+    stats["parse_cache"] = {"hits": parse_cache.hits, "misses": parse_cache.misses}
+    return stats
+
+
+if __name__ == "__main__":
+    print(check_lookup_service())
@@ -0,0 +1,322 @@
+import itertools
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from data_extractor import PropertyHTML, PropertyExtractor, Subdivision
+from models import Property
+
+# Lower values are served first.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Geocodes as listed in search results (03-0927-17-3-17-11-7003) or without dashes (03103332110110000).
+GEOCODE_PATTERN = re.compile(r"^\d{2}-?\d{4}-?\d{2}-?\d-?\d{2}-?\d{2}-?\d{4}$")
+
+
+class PropertyStore:
+    """
+    Stores property records in memory and as JSON files under data/lookup/[Year]/[Geocode].json.
+    """
+
+    def __init__(self, directory=os.path.join("data", "lookup"), max_memory_entries=10000):
+        """
+        Initializes a PropertyStore object.
+
+        :param directory: Root directory of the stored property records.
+        :param max_memory_entries: Number of records kept in memory.
+        """
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _filepath(self, geocode, year):
+        directory = os.path.realpath(self.directory)
+        filepath = os.path.realpath(os.path.join(directory, str(year), f"{geocode}.json"))
+        if os.path.commonpath([directory, filepath]) != directory:
+            raise ValueError(f"{geocode} is not a valid geocode")
+        return filepath
+
+    def get(self, geocode, year):
+        """
+        Return a stored property record.
+
+        :param geocode: The unique identifier for the property.
+        :param year: The year of the record.
+        :return: tuple of (source, record), where source is "memory" or "disk", or (None, None) if not stored.
+        """
+        key = (geocode, year)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return "memory", self.memory[key]
+        filepath = self._filepath(geocode, year)
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file:
+                record = json.load(file)
+            self._remember(key, record)
+            return "disk", record
+        return None, None
+
+    def put(self, geocode, year, record):
+        """
+        Store a property record in memory and on disk.
+
+        :param geocode: The unique identifier for the property.
+        :param year: The year of the record.
+        :param record: Dictionary produced by Property.json().
+        """
+        filepath = self._filepath(geocode, year)
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
+        # write to a temporary file and rename it, so that a concurrent get never reads a half written record.
+        descriptor, temporary_filepath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(record, file, indent=4)
+        os.replace(temporary_filepath, filepath)
+        self._remember((geocode, year), record)
+
+    def _remember(self, key, record):
+        with self.lock:
+            self.memory[key] = record
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory_entries:
+                self.memory.popitem(last=False)
+
+
+class LookupService:
+    """
+    Answers property lookups from the store first, and fetches missing properties with a pool of worker threads.
+
+    Concurrent lookups of the same property share a single fetch. Interactive lookups are served before background
+    work, and subdivisions that get warm_threshold lookups have their remaining properties fetched in the background.
+    """
+
+    def __init__(self, store=None, workers=4, warm_threshold=5, parse_cache=None):
+        """
+        Initializes a LookupService object and starts its worker threads.
+
+        :param store: PropertyStore holding the fetched records. Defaults to a PropertyStore under data/lookup.
+        :param workers: Number of properties fetched at the same time.
+        :param warm_threshold: Number of lookups in a subdivision after which the whole subdivision is pre-warmed.
+        :param parse_cache: Optional ParseCache passed to the Property objects.
+        """
+        self.store = store or PropertyStore()
+        self.warm_threshold = warm_threshold
+        self.parse_cache = parse_cache
+        self.queue = queue.PriorityQueue()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.sequence = itertools.count()
+        self.subdivision_lookups = Counter()
+        self.warmed_subdivisions = set()
+        self.counters = Counter()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def lookup(self, geocode, year=2023):
+        """
+        Return the record of a property, fetching it if it is not stored.
+
+        :param geocode: The unique identifier for the property.
+        :param year: The year of interest.
+        :return: tuple of (source, record), where source is "memory", "disk" or "fetched".
+        """
+        source, record = self.store.get(geocode, year)
+        if record is None:
+            source, record = "fetched", self.submit(geocode, year, INTERACTIVE).result()
+        with self.lock:
+            self.counters[source] += 1
+        self._record_lookup(geocode, record)
+        return source, record
+
+    def submit(self, geocode, year=2023, priority=BACKGROUND):
+        """
+        Queue a property fetch, or join the fetch already queued or running for it.
+
+        :param geocode: The unique identifier for the property.
+        :param year: The year of interest.
+        :param priority: INTERACTIVE or BACKGROUND.
+        :return: Future resolving to the property record.
+        """
+        key = (geocode, year)
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = Future()
+                self.in_flight[key] = future
+            elif priority == BACKGROUND:
+                return future
+            else:
+                self.counters["shared"] += 1
+        # a queued background fetch is queued again at interactive priority, the worker that gets to it first runs it.
+        self.queue.put((priority, next(self.sequence), key, future))
+        return future
+
+    def _work(self):
+        """Worker thread loop fetching queued properties in priority order."""
+        while True:
+            priority, _, key, future = self.queue.get()
+            with self.lock:
+                if future.running() or future.done():
+                    continue
+                future.set_running_or_notify_cancel()
+            try:
+                geocode, year = key
+                record = self._fetch(geocode, year)
+                self.store.put(geocode, year, record)
+                with self.lock:
+                    self.counters["fetches"] += 1
+                future.set_result(record)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.in_flight.pop(key, None)
+
+    def _fetch(self, geocode, year):
+        """
+        Fetch and parse all data for a property.
+
+        :param geocode: The unique identifier for the property.
+        :param year: The year of interest.
+        :return: Dictionary produced by Property.json().
+        """
+        property_html = PropertyHTML(geocode, year)
+        property_html.fetch_all_data(concurrent=True)
+        property_object = Property(parse_cache=self.parse_cache)
+        property_object.populate_from_property_html_object(property_html)
+        record = property_object.json()
+        record["year"] = year
+        return record
+
+    def _record_lookup(self, geocode, record):
+        """
+        Count a lookup against its subdivision and pre-warm the subdivision once it reaches warm_threshold lookups.
+
+        :param geocode: The unique identifier for the property.
+        :param record: The property record.
+        """
+        subdivision_name = record.get("subdivision")
+        if not subdivision_name:
+            return
+        # the first two digits of a geocode are the county id.
+        key = (geocode[:2], subdivision_name)
+        with self.lock:
+            self.subdivision_lookups[key] += 1
+            if self.subdivision_lookups[key] < self.warm_threshold or key in self.warmed_subdivisions:
+                return
+            self.warmed_subdivisions.add(key)
+        threading.Thread(target=self._warm, args=(key, record.get("year", 2023)), daemon=True).start()
+
+    def _warm(self, key, year):
+        """
+        Run warm_subdivision in the background, and allow it to be retried by a later lookup if it fails.
+
+        :param key: tuple of (county id, subdivision name).
+        :param year: The year of interest.
+        """
+        try:
+            self.warm_subdivision(key[0], key[1], year)
+        except Exception as e:
+            print(f"Warming subdivision {key[1]} of county {key[0]} failed. Error: {e}")
+            with self.lock:
+                self.warmed_subdivisions.discard(key)
+
+    def warm_subdivision(self, county_id, subdivision_name, year=2023):
+        """
+        Queue background fetches for every property of a subdivision that is not stored yet.
+
+        :param county_id: ID of the county.
+        :param subdivision_name: Name of the subdivision.
+        :param year: The year of interest.
+        :return: Number of properties queued.
+        """
+        subdivision = Subdivision(name=subdivision_name, county_name=None, county_id=county_id)
+        subdivision.fetch_properties()
+        queued = 0
+        for prop in PropertyExtractor(subdivision.properties_html).extract_properties():
+            if self.store.get(prop["Geocode"], year)[1] is None:
+                self.submit(prop["Geocode"], year, BACKGROUND)
+                queued += 1
+        return queued
+
+    def stats(self):
+        """
+        Return the service counters.
+        :return: a dictionary of counters
+        """
+        with self.lock:
+            return {"lookups": dict(self.counters),
+                    "queued": self.queue.qsize(),
+                    "in_flight": len(self.in_flight),
+                    "warmed_subdivisions": len(self.warmed_subdivisions),
+                    }
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles GET /property?geocode=[Geocode]&year=[Year] and GET /stats.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+        if url.path == "/stats":
+            self._send_json(200, service.stats())
+        elif url.path == "/property":
+            if "geocode" not in query:
+                self._send_json(400, {"error": "missing geocode"})
+                return
+            geocode = query["geocode"][0]
+            if not GEOCODE_PATTERN.match(geocode):
+                self._send_json(400, {"error": "geocode must look like 03-0927-17-3-17-11-7003"})
+                return
+            try:
+                year = int(query.get("year", ["2023"])[0])
+            except ValueError:
+                self._send_json(400, {"error": "year must be an integer"})
+                return
+            try:
+                source, record = service.lookup(geocode, year)
+            except Exception as e:
+                self._send_json(502, {"error": f"failed to fetch {geocode}: {e}"})
+                return
+            self._send_json(200, {"geocode": geocode, "year": year, "source": source, "property": record})
+        else:
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=8000, **kwargs):
+    """
+    Run the lookup service until interrupted.
+
+    :param host: Interface to listen on.
+    :param port: Port to listen on.
+    :param kwargs: keyword arguments passed to LookupService.
+    """
+    server = ThreadingHTTPServer((host, port), LookupRequestHandler)
+    server.service = LookupService(**kwargs)
+    print(f"Serving property lookups on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
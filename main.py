@@ -2,6 +2,7 @@ import json
 
 from data_extractor import Subdivision, PropertyHTML, PropertyExtractor
 from models import Property
+from snapshot_diff import save_snapshot
 
 county_name = "YELLOWSTONE"
 county_id = "03"
@@ -25,8 +26,8 @@ if __name__ == '__main__':
         property.populate_from_property_html_object(property_html_object)
         properties_data_list.append(property.json())
 
-    with open('samples.json', 'w') as f:
-        json.dump(properties_data_list, f, indent=4)
+    # also stores the snapshot index used by snapshot_diff.py
+    save_snapshot(properties_data_list, 'samples.json')
 
     with open('samples_timer.json', 'w') as f:
         json.dump(properties_timer_list, f, indent=4)
@@ -1,6 +1,12 @@
+from typing import TYPE_CHECKING
+
 from bs4 import BeautifulSoup
 
-from data_extractor import PropertyHTML
+from decorators import memoize_parse
+
+if TYPE_CHECKING:
+    # only needed for the type hint, importing it at runtime would pull in the http stack.
+    from data_extractor import PropertyHTML
 
 
 def extract_key_value_pairs(soup_objects):
@@ -35,13 +41,15 @@ class Property:
     Represents a property with various attributes extracted from multiple types of HTML formatted strings.
     """
 
-    def __init__(self, html_string=None):
+    def __init__(self, html_string=None, parse_cache=None):
         """
         Initializes a Property object with optional initial parsing.
 
         :param html_string: Optional initial HTML string for parsing.
+        :param parse_cache: Optional ParseCache used to skip parsing documents that were parsed before.
         """
         self.soup = BeautifulSoup(html_string, 'html.parser') if html_string else None
+        self.parse_cache = parse_cache
 
         # Property attributes
         self.geocode = None
@@ -137,6 +145,7 @@ class Property:
                 owner_details.append(owner_info)
         return owner_details
 
+    @memoize_parse("owner", ["owners"])
     def update_owner_details(self, html_string):
         """
         Parses owner details from the provided HTML string and updates the relevant attributes.
@@ -146,6 +155,7 @@ class Property:
         self.update_html(html_string)
         self.owners = self._extract_owner_details()
 
+    @memoize_parse("appraisal", ["land_value", "building_value", "yoY_difference"])
     def update_appraisal_history(self, html_string):
         """
         Parses appraisal history from the provided HTML string and updates the relevant attributes.
@@ -153,6 +163,8 @@ class Property:
         :param html_string: HTML string containing appraisal history.
         """
         self.update_html(html_string)
+        # reset first, it is only set when there is a previous year and the parse cache stores whatever it holds.
+        self.yoY_difference = None
         rows = self.soup.find_all('tr')[1:]
         current_year_data = rows[0].find_all('td')
         self.land_value = int(current_year_data[1].text)
@@ -162,6 +174,8 @@ class Property:
             total_value_2022 = int(rows[1].find_all('td')[3].text)
             self.yoY_difference = total_value_2023 - total_value_2022
 
+    @memoize_parse("summary", ["geocode", "legal_description", "total_market_land", "last_modified",
+                               "property_address", "sub_category", "subdivision"])
     def update_summary_data(self, html_string):
         """
         Parses summary data from the provided HTML string and updates the relevant attributes.
@@ -177,6 +191,7 @@ class Property:
         self.sub_category = self._extract_data_by_key("Subcategory:")
         self.subdivision = self._extract_data_by_key("Subdivision:")
 
+    @memoize_parse("commercial", ["building_details"])
     def update_commercial_data(self, html_string):
         """
         Parses commercial building details from the provided HTML string and updates the relevant attributes.
@@ -191,6 +206,7 @@ class Property:
             building_info = extract_key_value_pairs(columns)
             self.building_details.append(building_info)
 
+    @memoize_parse("other_building", ["other_building_details"])
     def update_other_building_data(self, html_string):
         """
         Parses other building or yard improvement details from the provided HTML string and updates the relevant attributes.
@@ -205,6 +221,7 @@ class Property:
             other_building_info = extract_key_value_pairs(columns)
             self.other_building_details.append(other_building_info)
 
+    @memoize_parse("market_land", ["market_land_details"])
     def update_market_land_data(self, html_string):
         """
         Parses market land data from the provided HTML string and updates the relevant attributes.
@@ -219,7 +236,7 @@ class Property:
             land_info = extract_key_value_pairs(columns)
             self.market_land_details.append(land_info)
 
-    def populate_from_property_html_object(self, obj: PropertyHTML):
+    def populate_from_property_html_object(self, obj: 'PropertyHTML'):
         """
         Populates the Property object with data from a PropertyHTML object.
 
@@ -234,12 +251,12 @@ class Property:
 
     def json(self):
         """
-        Returns a dictionary representation of the Property object. It excludes the soup attribute.
+        Returns a dictionary representation of the Property object. It excludes the soup and parse_cache attributes.
 
         :return: a dictionary representation of the Property object.
         """
         attributes = {}
         for key, value in self.__dict__.items():
-            if key != "soup":
+            if key not in ("soup", "parse_cache"):
                 attributes[key] = value
         return attributes
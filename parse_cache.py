@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Part of every key. Bump it whenever the parsing in the Property.update_* methods changes, so that results parsed by
+# the older code are no longer served.
+PARSER_VERSION = 2
+
+
+class ParseCache:
+    """
+    Bounded on-disk store of parsed endpoint documents, keyed by a hash of the endpoint and the raw HTML.
+
+    The store is a SQLite file, so it can be shared by worker processes on the same machine, and each thread uses
+    its own connection. The size is checked every check_interval puts, and once it is past max_entries the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, filepath=os.path.join("data", "parse_cache.sqlite"), max_entries=100000, check_interval=None):
+        """
+        Initializes a ParseCache object.
+
+        :param filepath: Path of the SQLite file backing the cache.
+        :param max_entries: Maximum number of parsed documents kept on disk.
+        :param check_interval: Number of puts between size checks. Defaults to a hundredth of max_entries.
+        """
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self.check_interval = check_interval or max(max_entries // 100, 1)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        """
+        Return the SQLite connection of the current thread, opening it on first use or after a fork.
+
+        :return: sqlite3 connection.
+        """
+        if getattr(self._local, "connection", None) is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.filepath)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.filepath, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS parsed (key TEXT PRIMARY KEY, value TEXT, last_used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS parsed_last_used ON parsed (last_used)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    @staticmethod
+    def key(endpoint, html_string):
+        """
+        Hash an endpoint document.
+
+        :param endpoint: Name of the endpoint the document came from, e.g. "owner".
+        :param html_string: Raw HTML string received from the endpoint.
+        :return: hex digest identifying the document.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"v{PARSER_VERSION}".encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(endpoint.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(html_string.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, endpoint, html_string):
+        """
+        Return the parsed result stored for a document.
+
+        :param endpoint: Name of the endpoint the document came from.
+        :param html_string: Raw HTML string received from the endpoint.
+        :return: the stored parsed result, or None if the document has not been parsed before.
+        """
+        connection = self._connect()
+        key = self.key(endpoint, html_string)
+        row = connection.execute("SELECT value FROM parsed WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        connection.execute("UPDATE parsed SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, endpoint, html_string, result):
+        """
+        Store the parsed result of a document, evicting the least recently used entries if the cache is full.
+
+        :param endpoint: Name of the endpoint the document came from.
+        :param html_string: Raw HTML string received from the endpoint.
+        :param result: JSON serializable parsed result.
+        """
+        connection = self._connect()
+        connection.execute("INSERT OR REPLACE INTO parsed (key, value, last_used) VALUES (?, ?, ?)",
+                           (self.key(endpoint, html_string), json.dumps(result), time.time()))
+        with self._lock:
+            self._puts += 1
+            if self._puts % self.check_interval:
+                return
+        # the count scans the table, so it is only taken every check_interval puts of this process. The cache can
+        # go over max_entries by that many puts per process in between.
+        count = connection.execute("SELECT COUNT(*) FROM parsed").fetchone()[0]
+        if count > self.max_entries:
+            # evict a tenth extra so that the following checks find room and do not evict again straight away.
+            excess = count - self.max_entries + self.max_entries // 10
+            connection.execute(
+                "DELETE FROM parsed WHERE key IN (SELECT key FROM parsed ORDER BY last_used LIMIT ?)", (excess,))
@@ -0,0 +1,227 @@
+import ast
+import csv
+import hashlib
+import json
+import os
+import sys
+
+# Groups of Property attributes that are hashed and compared separately.
+SECTIONS = {
+    "summary": ["legal_description", "last_modified", "property_address", "sub_category", "subdivision"],
+    "owners": ["owners"],
+    "values": ["land_value", "building_value", "yoY_difference"],
+    "buildings": ["building_details", "other_building_details"],
+    "land": ["total_market_land", "market_land_details"],
+}
+
+LIST_FIELDS = ["owners", "building_details", "other_building_details", "market_land_details"]
+
+
+def _normalize(value):
+    """
+    Normalize a field so that snapshots loaded from JSON and from CSV hash the same.
+
+    :param value: field value from a snapshot record.
+    :return: the value with scalars converted to strings and empty strings converted to None.
+    """
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _digest(value):
+    """
+    Hash a normalized value.
+
+    :param value: any JSON serializable value.
+    :return: hex digest of the value.
+    """
+    encoded = json.dumps(_normalize(value), sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def hash_record(record):
+    """
+    Hash every section of a property record, and the record as a whole.
+
+    :param record: dictionary produced by Property.json().
+    :return: tuple of (record digest, dictionary of section name to digest)
+    """
+    sections = {name: _digest([record.get(field) for field in fields]) for name, fields in SECTIONS.items()}
+    record_digest = hashlib.blake2b("".join(sections.values()).encode("utf-8"), digest_size=16).hexdigest()
+    return record_digest, sections
+
+
+def load_snapshot(filepath):
+    """
+    Load a stored snapshot of Property records from a JSON file (like samples.json) or a CSV file
+    (like complete_property_data.csv).
+
+    :param filepath: path to the snapshot file.
+    :return: list of property records.
+    """
+    if filepath.endswith(".csv"):
+        with open(filepath, "r", newline="") as file:
+            records = list(csv.DictReader(file))
+        for record in records:
+            for field in LIST_FIELDS:
+                if record.get(field):
+                    record[field] = ast.literal_eval(record[field])
+        return records
+    with open(filepath, "r") as file:
+        return json.load(file)
+
+
+def index_snapshot(records):
+    """
+    Hash a snapshot and sort it by geocode so that two snapshots can be merged in a single pass.
+
+    A geocode that appears more than once is kept once, with its last record, so that the merge stays in step.
+
+    :param records: list of property records.
+    :return: list of [geocode, record digest, section digests in SECTIONS order] entries sorted by geocode.
+    """
+    latest = {record["geocode"]: record for record in records if record.get("geocode")}
+    index = []
+    for geocode, record in latest.items():
+        record_digest, sections = hash_record(record)
+        index.append([geocode, record_digest, [sections[name] for name in SECTIONS]])
+    index.sort(key=lambda entry: entry[0])
+    return index
+
+
+def index_filepath(filepath):
+    """
+    Return the path of the index stored next to a snapshot.
+
+    :param filepath: path to the snapshot file.
+    :return: path of the index file, e.g. samples.json.index.json.
+    """
+    return f"{filepath}.index.json"
+
+
+def save_index(filepath, records=None):
+    """
+    Hash a snapshot and store its index next to it, so that later comparisons only merge the stored digests.
+
+    :param filepath: path to the snapshot file.
+    :param records: the records of the snapshot, loaded from filepath if not given.
+    :return: the index.
+    """
+    index = index_snapshot(load_snapshot(filepath) if records is None else records)
+    with open(index_filepath(filepath), "w") as file:
+        json.dump({"sections": list(SECTIONS), "entries": index}, file)
+    return index
+
+
+def load_index(filepath):
+    """
+    Return the index of a snapshot, from the stored index if it is up to date, or by hashing the snapshot and
+    storing its index otherwise.
+
+    :param filepath: path to the snapshot file.
+    :return: the index.
+    """
+    path = index_filepath(filepath)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(filepath):
+        with open(path, "r") as file:
+            stored = json.load(file)
+        if stored["sections"] == list(SECTIONS):
+            return stored["entries"]
+    return save_index(filepath)
+
+
+def save_snapshot(records, filepath):
+    """
+    Save a snapshot of Property records as JSON, with its index next to it.
+
+    :param records: list of property records.
+    :param filepath: path where the snapshot should be saved.
+    """
+    with open(filepath, "w") as file:
+        json.dump(records, file, indent=4)
+    save_index(filepath, records)
+
+
+def diff_snapshots(old_records, new_records):
+    """
+    Compare two snapshots and return a change log with one entry per added, removed or changed geocode.
+
+    :param old_records: list of property records from the earlier run or year.
+    :param new_records: list of property records from the later run or year.
+    :return: list of dictionaries with the geocode, the kind of change and the changed sections.
+    """
+    return diff_indexes(index_snapshot(old_records), index_snapshot(new_records))
+
+
+def diff_indexes(old_index, new_index):
+    """
+    Compare two snapshot indexes and return a change log with one entry per added, removed or changed geocode.
+
+    The indexes are sorted by geocode and walked together with a sort-merge. Only geocodes whose record digest
+    differs are compared section by section.
+
+    :param old_index: index of the earlier snapshot, from index_snapshot or load_index.
+    :param new_index: index of the later snapshot, from index_snapshot or load_index.
+    :return: list of dictionaries with the geocode, the kind of change and the changed sections.
+    """
+    changes = []
+    i = j = 0
+    while i < len(old_index) or j < len(new_index):
+        old = old_index[i] if i < len(old_index) else None
+        new = new_index[j] if j < len(new_index) else None
+        if new is None or (old is not None and old[0] < new[0]):
+            changes.append({"geocode": old[0], "change": "removed", "sections": []})
+            i += 1
+        elif old is None or new[0] < old[0]:
+            changes.append({"geocode": new[0], "change": "added", "sections": []})
+            j += 1
+        else:
+            if old[1] != new[1]:
+                sections = [name for name, old_digest, new_digest in zip(SECTIONS, old[2], new[2])
+                            if old_digest != new_digest]
+                changes.append({"geocode": new[0], "change": "changed", "sections": sections})
+            i += 1
+            j += 1
+    return changes
+
+
+def summarize_changes(changes):
+    """
+    Count the entries of a change log by kind of change and by section.
+
+    :param changes: change log returned by diff_snapshots.
+    :return: dictionary of counts.
+    """
+    summary = {"added": 0, "removed": 0, "changed": 0}
+    summary.update({name: 0 for name in SECTIONS})
+    for entry in changes:
+        summary[entry["change"]] += 1
+        for name in entry["sections"]:
+            summary[name] += 1
+    return summary
+
+
+def diff_snapshot_files(old_filepath, new_filepath, output_filepath):
+    """
+    Diff two stored snapshots and save the change log as JSON. The stored indexes are used when they are up to
+    date, and written next to the snapshots when they are not.
+
+    :param old_filepath: path to the earlier snapshot.
+    :param new_filepath: path to the later snapshot.
+    :param output_filepath: path where the change log should be saved.
+    :return: the change log.
+    """
+    changes = diff_indexes(load_index(old_filepath), load_index(new_filepath))
+    with open(output_filepath, "w") as file:
+        json.dump({"summary": summarize_changes(changes), "changes": changes}, file, indent=4)
+    return changes
+
+
+if __name__ == "__main__":
+    # usage: python snapshot_diff.py old_snapshot.json new_snapshot.json change_log.json
+    diff_snapshot_files(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -0,0 +1,63 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from api_caller import ApiCaller
+
+# A JSON-string-wrapped HTML document like the ones returned by the Cadastral API endpoints.
+SAMPLE_HTML = "<table>\r\n\t<tr>\r\n\t\t<td><span class='key'>Geocode:</span><span class='value'>03-1033-21-1-10-34-7000" \
+              "</span></td>\r\n\t</tr>\r\n</table>\r\n" * 200
+SAMPLE_BODY = json.dumps(SAMPLE_HTML).encode("utf-8")
+
+
+class CompressingRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves SAMPLE_BODY, gzip encoded when the client accepts it.
+    """
+
+    def do_GET(self):
+        body = SAMPLE_BODY
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check_transfer_stats(http2=False, requests_made=3):
+    """
+    Fetch the sample document from a local test server and check that it is received compressed and decoded intact.
+
+    :param http2: Use the httpx client of the ApiCaller.
+    :param requests_made: Number of requests sent.
+    :return: the transfer stats of the ApiCaller.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompressingRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        caller = ApiCaller(timeout=10, http2=http2)
+        url = f"http://127.0.0.1:{server.server_address[1]}/summary/getsummarydata"
+        for _ in range(requests_made):
+            response = caller.get(url)
+            assert response.content == SAMPLE_BODY, "decoded body does not match the served document"
+        stats = caller.transfer_stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert stats["bytes_decoded"] == len(SAMPLE_BODY) * requests_made, stats
+    assert 0 < stats["bytes_on_wire"] < stats["bytes_decoded"], stats
+    return stats
+
+
+if __name__ == "__main__":
+    print(check_transfer_stats())